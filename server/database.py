@@ -1,23 +1,71 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
 import os
 
-load_dotenv()
+# Lambda gets its environment from the function config; .env is only for local runs
+if os.getenv("AWS_LAMBDA_FUNCTION_NAME") is None:
+    from dotenv import load_dotenv
+    load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# A bare postgresql:// URL maps to psycopg (v3) in SQLAlchemy 2.1, which isn't
+# installed; pin the psycopg2 driver from requirements.txt
+if DATABASE_URL and make_url(DATABASE_URL).drivername == "postgresql":
+    DATABASE_URL = make_url(DATABASE_URL).set(drivername="postgresql+psycopg2")
+IS_LAMBDA = os.getenv("AWS_LAMBDA_FUNCTION_NAME") is not None
+# Behind RDS Proxy the proxy does the pooling, so connections aren't kept here
+USE_RDS_PROXY = os.getenv("USE_RDS_PROXY") == "1"
+# A Lambda container serves one request at a time, so it keeps a single hot
+# connection across warm invocations instead of reserving a pool of them
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "1" if IS_LAMBDA else "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0" if IS_LAMBDA else "20"))
+# Number of connections opened ahead of the first request (see warm_pool)
+POOL_WARM = int(os.getenv("POOL_WARM", "1"))
+# Seconds to wait for a new connection; warm_pool connects during INIT, so an
+# unreachable database must fail fast instead of hanging the cold start
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+CONNECT_ARGS = {"connect_timeout": DB_CONNECT_TIMEOUT}
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if USE_RDS_PROXY:
+    engine = create_engine(DATABASE_URL, poolclass=NullPool, connect_args=CONNECT_ARGS)
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args=CONNECT_ARGS,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=30,
+        # Replace connections idle across frozen Lambda invokes before the server
+        # (or RDS Proxy) drops them, instead of failing a pre-ping and reconnecting
+        pool_recycle=300,
+    )
+# expire_on_commit=False: objects stay loaded after commit, so reading them
+# afterwards (e.g. building a response) doesn't issue another SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
+def warm_pool(size: int = POOL_WARM):
+    """Open pooled connections up front so the first request skips the connect handshake"""
+    if USE_RDS_PROXY:
+        # NullPool closes connections on release; there is nothing to keep warm
+        return
+    # Never ask for more connections than the pool can hold at once
+    size = min(size, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    connections = []
+    try:
+        # Hold all connections at once so each one is a distinct pooled connection
+        for _ in range(size):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            connections.append(conn)
+    finally:
+        # Closing returns them to the pool's idle list
+        for conn in connections:
+            conn.close()
+
 def get_db():
     db = SessionLocal()
     try:
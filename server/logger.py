@@ -1,10 +1,46 @@
 """
 Logging configuration for the FastAPI application
 """
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import time
+from contextvars import ContextVar
 from datetime import datetime
 
+# Skip thread/process bookkeeping on every LogRecord; the format string doesn't use it
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# Request ID of the request currently being handled (set by RequestLoggingMiddleware)
+request_id_ctx: ContextVar[str] = ContextVar("request_id", default="-")
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to every log record"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_ctx.get()
+        return True
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders the (second-resolution) timestamp at most once per second"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = None
+        self._last_time = ""
+    
+    def formatTime(self, record: logging.LogRecord, datefmt: str = None) -> str:
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_time = time.strftime(datefmt or self.default_time_format, self.converter(second))
+        return self._last_time
+
 def setup_logger(name: str = "fastapi_app") -> logging.Logger:
     """
     Configure and return a logger instance
@@ -28,14 +64,34 @@ def setup_logger(name: str = "fastapi_app") -> logging.Logger:
     console_handler.setLevel(logging.INFO)
     
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    formatter = CachedTimeFormatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     console_handler.setFormatter(formatter)
     
+    if os.getenv("AWS_LAMBDA_FUNCTION_NAME") is not None:
+        # Lambda freezes the environment after each invoke and may reclaim it
+        # without running atexit, so records still queued for a background
+        # thread would be delayed or lost; write them synchronously instead
+        console_handler.addFilter(RequestIdFilter())
+        handler = console_handler
+    else:
+        # Hand records to a queue; a background listener thread does the stdout writes
+        # so logging calls on the request path never block on a write() syscall
+        log_queue = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(log_queue)
+        # Request ID lives in a ContextVar, so it must be captured before the record is queued
+        handler.addFilter(RequestIdFilter())
+        listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+        listener.start()
+        # Flush queued records before the process exits
+        atexit.register(listener.stop)
+    
     # Add handler to logger
-    logger.addHandler(console_handler)
+    logger.addHandler(handler)
+    # Records are fully handled here; don't walk up to the root logger
+    logger.propagate = False
     
     return logger
 
@@ -1,21 +1,23 @@
 from fastapi import FastAPI, Request, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-from database import get_db, engine, Base
+from database import engine, get_db, warm_pool
 from routers.auth import router as auth_router
 from routers.posts import router as posts_router
-from middleware import RequestLoggingMiddleware
+from middleware import CachedPreflightCORSMiddleware, RequestLoggingMiddleware
 from logger import logger
-from dotenv import load_dotenv
 from mangum import Mangum
+import json
 import os
+import time
 
-# Load environment variables
-load_dotenv()
+# Load environment variables from .env for local runs; Lambda injects them natively
+if os.getenv("AWS_LAMBDA_FUNCTION_NAME") is None:
+    from dotenv import load_dotenv
+    load_dotenv()
 
 app = FastAPI(
     title="Social Hub API",
@@ -24,34 +26,35 @@ app = FastAPI(
     redirect_slashes=False  # Disable automatic redirects to avoid CORS issues
 )
 
-@app.on_event("startup")
-async def startup_event():
-    """Run migrations and initialize database on startup"""
-    logger.info("Initializing FastAPI application")
+# All initialization runs at import time (Lambda INIT phase); there is no startup
+# event. Schema migrations run at deploy time, not here.
+
+# Warm the connection pool at import time so Lambda runs the DB handshake
+# during the INIT phase instead of on the first invocation
+try:
+    warm_pool()
+except Exception as e:
+    logger.warning(f"Connection pool warm-up failed: {str(e)}")
+
+# With SnapStart, INIT runs once when a version is published and containers are
+# restored from its snapshot. Pooled sockets can't survive that, so drop them
+# before the snapshot and re-warm on restore. The hooks module only exists in
+# the Lambda runtime
+try:
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+except ImportError:
+    pass
+else:
+    @register_before_snapshot
+    def dispose_pool_before_snapshot():
+        engine.dispose()
     
-    # Run database migrations in background to avoid blocking startup
-    # If migrations fail, the app will still start and migrations can run on next request
-    try:
-        from migrations.migrate import run_migrations
-        logger.info("Running database migrations...")
-        run_migrations()
-        logger.info("Migrations completed successfully")
-    except Exception as e:
-        logger.error(f"Migration error: {str(e)}", exc_info=True)
-        # Continue anyway - migrations might have failed but app can still start
-        logger.warning("Continuing startup despite migration errors")
-    
-    # Create tables (for new deployments) - non-blocking
-    try:
-        logger.info("Checking database tables...")
-        # Don't block on table creation - let it happen lazily
-        # Base.metadata.create_all(bind=engine)
-        logger.info("Database initialization check complete!")
-    except Exception as e:
-        logger.error(f"Database check error: {str(e)}", exc_info=True)
-        # Continue anyway - tables might already exist
-    
-    logger.info("FastAPI application startup complete!")
+    @register_after_restore
+    def warm_pool_after_restore():
+        try:
+            warm_pool()
+        except Exception as e:
+            logger.warning(f"Connection pool warm-up after restore failed: {str(e)}")
 
 # Add Request Logging Middleware (should be first)
 app.add_middleware(RequestLoggingMiddleware)
@@ -62,71 +65,82 @@ cors_origins = [origin.strip() for origin in cors_origins_env.split(",") if orig
     "https://galleryai.hanumantjain.tech",
 ]
 
-# Log CORS configuration
-logger.info(f"CORS origins configured: {cors_origins}")
+# Normalized (lowercase) origin -> configured origin, for O(1) per-request matching
+_cors_lookup = {origin.lower().strip(): origin for origin in cors_origins}
+
+# Single cold-start log line (includes CORS configuration)
+logger.info(f"cold start - CORS origins configured: {cors_origins}")
+
+# How long (seconds) browsers may cache a preflight result before sending another OPTIONS
+CORS_MAX_AGE = 86400
+
+# Static CORS headers, built once; only needed on responses produced outside
+# CORSMiddleware (see general_exception_handler)
+# Pre-encoded so add_cors_headers can append them to the raw header list in one call
+_CORS_STATIC_HEADERS = (
+    (b"access-control-allow-credentials", b"true"),
+    (b"access-control-allow-methods", b"GET, POST, PUT, DELETE, OPTIONS, PATCH"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-max-age", str(CORS_MAX_AGE).encode("latin-1")),
+)
 
+# CORSMiddleware answers preflights itself; this subclass also marks successful
+# ones cacheable (Cache-Control) for the same CORS_MAX_AGE
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=cors_origins,
+    CachedPreflightCORSMiddleware,
+    # Browsers send origins lowercased; frozenset makes the per-request
+    # `origin in allow_origins` check O(1)
+    allow_origins=frozenset(_cors_lookup),
+    allow_origin_regex=None,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
     expose_headers=["*"],
-    max_age=3600,
+    max_age=CORS_MAX_AGE,
 )
 
-# Helper function to add CORS headers to any response
-def add_cors_headers(response, origin: str = None):
-    """Add CORS headers to response"""
+def resolve_cors_origin(origin: str = None):
+    """Return the allowed origin to echo back for a request origin, or None if no origins are configured"""
     # Check if origin is in allowed list (case-insensitive)
-    origin_lower = (origin or "").lower().strip()
-    allowed_origin = None
-    
-    for allowed in cors_origins:
-        if allowed.lower().strip() == origin_lower:
-            allowed_origin = allowed
-            break
-    
-    # Set the origin - must match exactly or use first allowed
+    allowed_origin = _cors_lookup.get((origin or "").lower().strip())
     if allowed_origin:
-        response.headers["Access-Control-Allow-Origin"] = allowed_origin
-    elif cors_origins and origin_lower:
-        # If origin provided but not in list, use first allowed (strict)
-        response.headers["Access-Control-Allow-Origin"] = cors_origins[0]
-    elif cors_origins:
-        # No origin in request, use first allowed
-        response.headers["Access-Control-Allow-Origin"] = cors_origins[0]
+        return allowed_origin
+    
+    # Origin missing or not in list - use first allowed (strict)
+    return cors_origins[0] if cors_origins else None
+
+# Helper function to add CORS headers to any response
+def add_cors_headers(response, origin: str = None):
+    """Add CORS headers to a freshly built response (appended, not merged with existing ones)"""
+    allowed_origin = resolve_cors_origin(origin)
     
     # Always set these headers if origin was set
-    if "Access-Control-Allow-Origin" in response.headers:
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
-        response.headers["Access-Control-Allow-Headers"] = "*"
-        response.headers["Access-Control-Max-Age"] = "3600"
+    if allowed_origin:
+        response.raw_headers.append((b"access-control-allow-origin", allowed_origin.encode("latin-1")))
+        response.raw_headers.extend(_CORS_STATIC_HEADERS)
     
     return response
 
-# Exception handlers to ensure CORS headers are included in error responses
+# Exception handlers. HTTP and validation errors are handled inside
+# CORSMiddleware, which adds the CORS headers to their responses
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    """Handle HTTP exceptions with CORS headers"""
-    origin = request.headers.get("origin", "")
-    response = JSONResponse(
+    """Handle HTTP exceptions"""
+    return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
     )
-    return add_cors_headers(response, origin)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    """Handle validation errors with CORS headers"""
-    origin = request.headers.get("origin", "")
-    response = JSONResponse(
+    """Handle validation errors"""
+    return JSONResponse(
         status_code=422,
         content={"detail": exc.errors()}
     )
-    return add_cors_headers(response, origin)
 
+# Unhandled exceptions are handled by the outermost ServerErrorMiddleware, which
+# sits outside CORSMiddleware, so this handler adds the CORS headers itself
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions with CORS headers"""
@@ -138,59 +152,41 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
     return add_cors_headers(response, origin)
 
-# Add middleware to ensure CORS headers on all responses (must be after CORS middleware)
-@app.middleware("http")
-async def ensure_cors_headers(request: Request, call_next):
-    """Ensure CORS headers are added to all responses"""
-    # Get origin from request early
-    origin = request.headers.get("origin", "")
-    
-    # Handle OPTIONS preflight requests directly
-    if request.method == "OPTIONS":
-        response = JSONResponse(content={}, status_code=200)
-        return add_cors_headers(response, origin)
-    
-    # Log the path for debugging
-    path = request.url.path
-    logger.debug(f"Request path: {path}, Origin: {origin}, Method: {request.method}")
-    
-    try:
-        response = await call_next(request)
-    except Exception as e:
-        logger.error(f"Error processing request: {str(e)}", exc_info=True)
-        response = JSONResponse(
-            status_code=500,
-            content={"detail": "Internal server error"}
-        )
-    
-    # Force add CORS headers to ALL responses (even if already present, ensures they're correct)
-    add_cors_headers(response, origin)
-    
-    # Log CORS headers for debugging
-    logger.debug(f"Response status: {response.status_code}, CORS Origin: {response.headers.get('Access-Control-Allow-Origin')}")
-    
-    return response
-
 # Routers
 app.include_router(auth_router, prefix="/auth", tags=["authentication"])
 app.include_router(posts_router, prefix="/api/posts", tags=["posts"])
 
+# Constant response bodies, encoded once at import instead of on every request
+_ROOT_BYTES = json.dumps({"message": "Social Hub API", "version": "1.0.0"}, separators=(",", ":")).encode()
+_HEALTH_OK_BYTES = json.dumps({"status": "healthy", "database": "connected"}, separators=(",", ":")).encode()
+
 @app.get("/")
 def read_root():
     """Root endpoint"""
-    return {"message": "Social Hub API", "version": "1.0.0"}
+    return Response(content=_ROOT_BYTES, media_type="application/json")
+
+# Constant health-check statement, built once instead of per request
+_PING_STMT = text("SELECT 1")
+
+# A successful DB ping is reused for this many seconds, so frequent health
+# probes don't each cost a database round trip
+HEALTH_CACHE_SECONDS = 5.0
+_last_health_ok = float("-inf")
 
 @app.get("/health")
 def health_check(db: Session = Depends(get_db)):
     """Health check endpoint"""
+    global _last_health_ok
+    now = time.monotonic()
+    if now - _last_health_ok < HEALTH_CACHE_SECONDS:
+        return Response(content=_HEALTH_OK_BYTES, media_type="application/json")
     try:
-        db.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected"}
+        db.execute(_PING_STMT)
+        _last_health_ok = now
+        return Response(content=_HEALTH_OK_BYTES, media_type="application/json")
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
-# Lambda handler - use lifespan="on" to allow startup events
-# Note: With lifespan="on", startup runs on cold start, which adds ~100-200ms latency
-# But it's necessary for database migrations
-handler = Mangum(app, lifespan="on")
+# Lambda handler - lifespan is off since all initialization happens at import time
+handler = Mangum(app, lifespan="off")
@@ -2,6 +2,7 @@
 Middleware package
 """
 from .logging_middleware import RequestLoggingMiddleware
+from .cors_middleware import CachedPreflightCORSMiddleware
 
-__all__ = ["RequestLoggingMiddleware"]
+__all__ = ["RequestLoggingMiddleware", "CachedPreflightCORSMiddleware"]
 
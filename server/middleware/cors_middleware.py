@@ -0,0 +1,29 @@
+"""
+CORS middleware with cacheable preflight responses
+"""
+from starlette.datastructures import Headers
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.types import ASGIApp
+
+class CachedPreflightCORSMiddleware(CORSMiddleware):
+    """
+    Starlette's CORSMiddleware, plus a Cache-Control header on successful
+    preflight responses.
+    
+    Access-Control-Max-Age only lets the browser reuse a preflight; the
+    Cache-Control header lets a CDN or proxy in front of the API serve it too.
+    Preflight responses already carry `Vary: Origin`, so cached copies are
+    kept per origin.
+    """
+    
+    def __init__(self, app: ASGIApp, max_age: int = 600, **kwargs):
+        super().__init__(app, max_age=max_age, **kwargs)
+        self.preflight_cache_control = f"public, max-age={max_age}"
+    
+    def preflight_response(self, request_headers: Headers) -> Response:
+        response = super().preflight_response(request_headers)
+        # Rejected preflights (400) are not cached
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = self.preflight_cache_control
+        return response
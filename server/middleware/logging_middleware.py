@@ -1,58 +1,77 @@
 """
 Middleware for logging all HTTP requests and responses
 """
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from uuid import uuid4
+import logging
 import time
-from logger import logger
+from logger import logger, request_id_ctx
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class RequestLoggingMiddleware:
     """
-    Middleware to log all incoming requests and their responses
+    Pure ASGI middleware to log all incoming requests and their responses.
+    
+    Avoids BaseHTTPMiddleware so no Request/Response objects or task groups
+    are created per request, and response streaming is not blocked.
     """
     
-    async def dispatch(self, request: Request, call_next):
-        # Start timer
-        start_time = time.time()
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Start timer (integer nanoseconds; converted to ms only when reported)
+        start_ns = time.perf_counter_ns()
+        
+        # Skip building log messages entirely when INFO is filtered out
+        log_info = logger.isEnabledFor(logging.INFO)
         
         # Get request details
-        method = request.method
-        url = str(request.url)
-        client_host = request.client.host if request.client else "unknown"
+        method = scope["method"]
+        url = scope["path"]
+        if scope.get("query_string"):
+            url = f"{url}?{scope['query_string'].decode('latin-1')}"
         
-        # Log incoming request
-        logger.info(f"Incoming Request: {method} {url} from {client_host}")
+        # Tag every log line emitted while handling this request
+        request_id = uuid4().hex
+        token = request_id_ctx.set(request_id)
+        request_id_header = request_id.encode("latin-1")
+        status_code = 500
         
-        # Log request headers (optional - can be verbose)
-        # logger.debug(f"Request Headers: {dict(request.headers)}")
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                process_time = (time.perf_counter_ns() - start_ns) / 1e6
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id_header))
+                # Add custom header with processing time
+                headers.append((b"x-process-time", str(process_time).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+            if log_info and message["type"] == "http.response.body" and not message.get("more_body", False):
+                # One record per request, once the final body chunk has been sent.
+                # Lazy %-style args: the message is only formatted if a handler emits it
+                process_time = (time.perf_counter_ns() - start_ns) / 1e6
+                client = scope.get("client")
+                client_host = client[0] if client else "unknown"
+                logger.info(
+                    "Request: %s %s from %s - Status: %s - Duration: %.2fms",
+                    method, url, client_host, status_code, process_time,
+                )
         
         try:
-            # Process the request
-            response: Response = await call_next(request)
-            
-            # Calculate processing time
-            process_time = (time.time() - start_time) * 1000
-            
-            # Log response
-            logger.info(
-                f"Response: {method} {url} - "
-                f"Status: {response.status_code} - "
-                f"Duration: {process_time:.2f}ms"
-            )
-            
-            # Add custom header with processing time
-            response.headers["X-Process-Time"] = str(process_time)
-            
-            return response
-            
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # Log any errors that occur
-            process_time = (time.time() - start_time) * 1000
+            process_time = (time.perf_counter_ns() - start_ns) / 1e6
             logger.error(
-                f"Request Failed: {method} {url} - "
-                f"Error: {str(e)} - "
-                f"Duration: {process_time:.2f}ms"
+                "Request Failed: %s %s - Error: %s - Duration: %.2fms",
+                method, url, e, process_time,
             )
             raise
-
+        finally:
+            request_id_ctx.reset(token)
@@ -0,0 +1,11 @@
+-- Migration: Index for the posts feed
+-- Created: 2026-10-15
+-- Description: 
+--   1. Add a (created_at DESC, id DESC) index on posts so the feed query
+--      (ORDER BY created_at DESC, id DESC LIMIT n, optionally
+--      filtered on a (created_at, id) cursor) is an index range scan instead of a sort
+--   Built CONCURRENTLY so writes to posts are not blocked during the deploy.
+--   The .concurrent.sql suffix makes migrate.py run it outside a transaction.
+--   migrate.py drops an INVALID index left by a failed or interrupted build.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_created_at_id ON posts(created_at DESC, id DESC);
@@ -0,0 +1,25 @@
+-- Migration: Add columns the models use that no earlier migration created
+-- Created: 2026-10-15
+-- Description: 
+--   1. Add bio column to users table
+--   2. Add views and downloads counter columns to posts table
+--   Every statement uses ADD COLUMN IF NOT EXISTS, so no information_schema
+--   probe is needed and re-running against an up-to-date schema is a no-op
+
+BEGIN;
+
+-- ============================================
+-- USERS TABLE CHANGES
+-- ============================================
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS bio VARCHAR;
+
+-- ============================================
+-- POSTS TABLE CHANGES
+-- ============================================
+
+ALTER TABLE posts
+    ADD COLUMN IF NOT EXISTS views INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS downloads INTEGER NOT NULL DEFAULT 0;
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- Migration: Index for per-user post listings
+-- Created: 2026-10-15
+-- Description: 
+--   1. Add a (user_id, created_at DESC, id DESC) index on posts so
+--      /api/posts/user/{user_id} reads one user's posts in feed order with an
+--      index range scan instead of scanning posts and sorting
+--   Built CONCURRENTLY so writes to posts are not blocked during the deploy.
+--   The .concurrent.sql suffix makes migrate.py run it outside a transaction.
+--   migrate.py drops an INVALID index left by a failed or interrupted build.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_user_created_at ON posts(user_id, created_at DESC, id DESC);
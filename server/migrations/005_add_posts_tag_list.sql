@@ -0,0 +1,23 @@
+-- Migration: Add an array column for post tags (expand step)
+-- Created: 2026-10-15
+-- Description: 
+--   1. Add posts.tag_list (text[]) next to the comma-separated posts.tags
+--   2. Backfill it from posts.tags; empty strings become NULL
+--   posts.tags is left untouched, so the code that is still live while this
+--   migration runs (deploys migrate first) keeps reading and writing it.
+--   The new code writes both columns. A later release backfills rows the
+--   old code wrote in between and drops posts.tags (contract step).
+
+BEGIN;
+
+-- ============================================
+-- POSTS TABLE CHANGES
+-- ============================================
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS tag_list TEXT[];
+
+UPDATE posts
+SET tag_list = string_to_array(NULLIF(tags, ''), ',')
+WHERE tag_list IS NULL AND tags IS NOT NULL AND tags <> '';
+
+COMMIT;
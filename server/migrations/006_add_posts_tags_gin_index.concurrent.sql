@@ -0,0 +1,10 @@
+-- Migration: GIN index on post tags
+-- Created: 2026-10-15
+-- Description: 
+--   1. Add a GIN index on posts.tag_list so tag lookups
+--      (tag_list @> ARRAY['x']) use an index instead of scanning every post
+--   Built CONCURRENTLY so writes to posts are not blocked during the deploy.
+--   The .concurrent.sql suffix makes migrate.py run it outside a transaction.
+--   migrate.py drops an INVALID index left by a failed or interrupted build.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_tag_list_gin ON posts USING GIN (tag_list);
@@ -0,0 +1,18 @@
+-- Migration: Database-side defaults for post timestamps
+-- Created: 2026-10-15
+-- Description: 
+--   1. Default posts.created_at and posts.updated_at to now() so the API can
+--      leave them out of INSERTs (models/post.py uses server_default)
+--   SET DEFAULT only changes the catalog; existing rows are not rewritten.
+
+BEGIN;
+
+-- ============================================
+-- POSTS TABLE CHANGES
+-- ============================================
+
+ALTER TABLE posts
+    ALTER COLUMN created_at SET DEFAULT now(),
+    ALTER COLUMN updated_at SET DEFAULT now();
+
+COMMIT;
@@ -5,24 +5,87 @@ Applies SQL migrations to update the database schema.
 """
 
 import os
+import re
 import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 # Add parent directory to path to import database module
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from sqlalchemy import text
-from database import engine, SessionLocal
+from database import Base, engine, SessionLocal
 from logger import logger
 
+# Advisory lock key shared by every migration run against the same database
+MIGRATION_LOCK_KEY = 0x736F6369616C  # "social"
+
+# Migrations with this suffix run outside a transaction (needed for CREATE INDEX CONCURRENTLY)
+CONCURRENT_SUFFIX = ".concurrent.sql"
+
+# Fail fast instead of queueing behind (and blocking) live traffic on a table lock.
+# Applied to transactional migrations only (is_local=true: they end with the
+# migration's transaction and don't follow the connection back to the pool);
+# CONCURRENTLY builds don't take blocking locks and run without limits
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+MIGRATION_STATEMENT_TIMEOUT = os.getenv("MIGRATION_STATEMENT_TIMEOUT", "60s")
+# Name of the index a CREATE INDEX CONCURRENTLY statement builds
+CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.\"]+)",
+    re.IGNORECASE,
+)
+# True if the index exists but is INVALID (a failed or interrupted build), NULL if absent
+INDEX_INVALID_SQL = "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%(name)s)"
+
+SET_TIMEOUTS_SQL = """
+        SELECT set_config('lock_timeout', :lock_timeout, true),
+               set_config('statement_timeout', :statement_timeout, true);
+"""
+
 def get_migration_files():
     """Get all migration SQL files in order"""
     migrations_dir = Path(__file__).parent
     migration_files = sorted(migrations_dir.glob("*.sql"))
     return migration_files
 
-def check_migration_applied(db, migration_name):
-    """Check if a migration has already been applied"""
+@contextmanager
+def migration_lock():
+    """Hold a Postgres advisory lock so concurrent runs (e.g. overlapping deploys) apply migrations one at a time"""
+    conn = engine.connect()
+    try:
+        # Blocks until any other run finishes; that run's migrations are then seen as applied
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        # Session-level lock outlives the transaction; don't sit idle in one while
+        # migrations run (CREATE INDEX CONCURRENTLY waits on open transactions)
+        conn.commit()
+        yield
+    finally:
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        finally:
+            conn.close()
+
+def create_tables():
+    """Create any missing tables from the ORM models (bootstraps a fresh database)"""
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    table_names = list(Base.metadata.tables)
+    
+    # One to_regclass lookup for all tables instead of create_all's per-table reflection
+    with engine.connect() as conn:
+        existing = conn.execute(
+            text("SELECT count(to_regclass(name)) FROM unnest(CAST(:names AS text[])) AS name"),
+            {"names": table_names}
+        ).scalar()
+    if existing == len(table_names):
+        logger.info("All tables already exist, skipping create_all")
+        return
+    
+    # create_all emits all of its DDL in a single transaction
+    Base.metadata.create_all(bind=engine)
+
+def load_applied_migrations(db):
+    """Return the names of all migrations that have already been applied"""
     # Create migrations table if it doesn't exist
     db.execute(text("""
         CREATE TABLE IF NOT EXISTS schema_migrations (
@@ -33,48 +96,101 @@ def check_migration_applied(db, migration_name):
     """))
     db.commit()
     
-    # Check if migration exists
-    result = db.execute(text("""
-        SELECT 1 FROM schema_migrations 
-        WHERE migration_name = :migration_name
-    """), {"migration_name": migration_name})
+    # Fetch every applied migration in one round trip
+    result = db.execute(text("SELECT migration_name FROM schema_migrations"))
     
-    return result.fetchone() is not None
+    return {row[0] for row in result}
 
-def mark_migration_applied(db, migration_name):
-    """Mark a migration as applied"""
-    db.execute(text("""
+MARK_APPLIED_SQL = """
         INSERT INTO schema_migrations (migration_name) 
         VALUES (:migration_name)
         ON CONFLICT (migration_name) DO NOTHING
-    """), {"migration_name": migration_name})
+"""
+
+def mark_migration_applied(db, migration_name):
+    """Mark a migration as applied"""
+    db.execute(text(MARK_APPLIED_SQL), {"migration_name": migration_name})
     db.commit()
 
-def apply_migration(migration_file):
+def split_statements(sql_content):
+    """Split a migration into individual statements, dropping comment lines"""
+    lines = [line for line in sql_content.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+def drop_invalid_index(conn, index_name):
+    """Drop `index_name` if it exists but is INVALID; returns True if it was dropped"""
+    if not conn.exec_driver_sql(INDEX_INVALID_SQL, {"name": index_name}).scalar():
+        return False
+    logger.warning(f"  Dropping INVALID index {index_name}")
+    conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+    return True
+
+def apply_concurrent_migration(sql_content):
+    """Execute a migration statement by statement in autocommit mode"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # A timed-out CONCURRENTLY build leaves an INVALID index behind, so make
+        # sure no limits are in effect on this (pooled) connection
+        conn.exec_driver_sql("SET statement_timeout = 0")
+        conn.exec_driver_sql("SET lock_timeout = 0")
+        # Sent one at a time; a multi-statement string would run as one implicit transaction
+        for statement in split_statements(sql_content):
+            match = CONCURRENT_INDEX_RE.search(statement)
+            index_name = match.group(1) if match else None
+            # IF NOT EXISTS would skip over an INVALID index left by an interrupted run
+            if index_name:
+                drop_invalid_index(conn, index_name)
+            
+            start = time.perf_counter()
+            try:
+                conn.exec_driver_sql(statement)
+            except Exception:
+                if index_name:
+                    drop_invalid_index(conn, index_name)
+                raise
+            
+            # Confirm the build produced a usable index before the migration
+            # can be recorded as applied
+            if index_name and drop_invalid_index(conn, index_name):
+                raise RuntimeError(f"Index {index_name} was built INVALID and has been dropped")
+            logger.info(f"  {statement.splitlines()[0]} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+def apply_migration(migration_file, applied_migrations):
     """Apply a single migration file"""
     migration_name = migration_file.name
     
+    # Check if migration already applied
+    if migration_name in applied_migrations:
+        logger.info(f"Migration {migration_name} already applied, skipping...")
+        return True
+    
     db = SessionLocal()
     try:
-        # Check if migration already applied
-        if check_migration_applied(db, migration_name):
-            logger.info(f"Migration {migration_name} already applied, skipping...")
-            return True
-        
         logger.info(f"Applying migration: {migration_name}")
         
         # Read and execute migration SQL
         with open(migration_file, 'r') as f:
             sql_content = f.read()
         
-        # Execute migration (it should handle its own transactions)
-        db.execute(text(sql_content))
-        db.commit()
-        
-        # Mark migration as applied
-        mark_migration_applied(db, migration_name)
+        start = time.perf_counter()
+        if migration_name.endswith(CONCURRENT_SUFFIX):
+            apply_concurrent_migration(sql_content)
+            
+            # Mark migration as applied
+            mark_migration_applied(db, migration_name)
+        else:
+            # Set the timeouts, execute migration (it should handle its own
+            # transactions) and mark it applied in the same batch; an error in
+            # the migration stops the batch before the INSERT runs
+            batch = SET_TIMEOUTS_SQL + sql_content.rstrip().rstrip(";") + ";\n" + MARK_APPLIED_SQL
+            db.execute(text(batch), {
+                "lock_timeout": MIGRATION_LOCK_TIMEOUT,
+                "statement_timeout": MIGRATION_STATEMENT_TIMEOUT,
+                "migration_name": migration_name,
+            })
+            db.commit()
         
-        logger.info(f"✓ Successfully applied migration: {migration_name}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"✓ Successfully applied migration: {migration_name} ({elapsed_ms:.0f}ms)")
         return True
         
     except Exception as e:
@@ -96,15 +212,28 @@ def run_migrations():
     
     logger.info(f"Found {len(migration_files)} migration file(s)")
     
-    for migration_file in migration_files:
-        try:
-            apply_migration(migration_file)
-        except Exception as e:
-            logger.error(f"Migration failed: {e}")
-            # Don't exit when called from startup - just log the error
-            if __name__ == "__main__":
-                sys.exit(1)
-            return False
+    try:
+        with migration_lock():
+            # Table creation is opt-in: on an existing schema create_all only
+            # adds a catalog scan per table, so it's skipped unless requested
+            if os.getenv("RUN_CREATE_ALL") == "1":
+                logger.info("RUN_CREATE_ALL=1, creating missing tables...")
+                create_tables()
+            
+            db = SessionLocal()
+            try:
+                applied_migrations = load_applied_migrations(db)
+            finally:
+                db.close()
+            
+            for migration_file in migration_files:
+                apply_migration(migration_file, applied_migrations)
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        # Don't exit when called from startup - just log the error
+        if __name__ == "__main__":
+            sys.exit(1)
+        return False
     
     logger.info("All migrations completed successfully!")
     return True
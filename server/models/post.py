@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, func
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from database import Base
-from datetime import datetime
 
 class Post(Base):
     __tablename__ = "posts"
@@ -12,11 +12,27 @@ class Post(Base):
     title = Column(String, nullable=True)
     caption = Column(String, nullable=True)
     tags = Column(String, nullable=True)  # Store as comma-separated string
+    # Same tags as an array for indexed lookups; written alongside tags until
+    # the string column is dropped (see migration 005)
+    tag_list = Column(ARRAY(Text), nullable=True)
     views = Column(Integer, default=0, nullable=False)
     downloads = Column(Integer, default=0, nullable=False)
-    created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Timestamps come from the database clock (see migration 007) instead of being sent as binds
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationship to User
     user = relationship("User", back_populates="posts")
+    
+    __table_args__ = (
+        # Feed ordering / keyset pagination (see routers/posts.py FEED_STMT)
+        Index("idx_posts_created_at_id", created_at.desc(), id.desc()),
+        # Per-user listing in the same order (see routers/posts.py USER_POSTS_STMT)
+        Index("idx_posts_user_created_at", user_id, created_at.desc(), id.desc()),
+        # Tag containment lookups (tag_list @> ARRAY[...])
+        Index("idx_posts_tag_list_gin", tag_list, postgresql_using="gin"),
+    )
+    # Fetch server-generated columns with RETURNING on INSERT/UPDATE, so no
+    # refresh SELECT is needed after commit
+    __mapper_args__ = {"eager_defaults": True}
 
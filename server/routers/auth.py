@@ -1,20 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import bindparam, or_, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import get_db
 from models.user import User
 from schemas.auth import UserCreate, UserLogin, UserResponse, Token, TokenData, UserUpdate, GoogleOAuthRequest
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+import jwt
+from jwt import InvalidTokenError as JWTError
 from datetime import datetime, timedelta
+from functools import lru_cache
 from logger import logger
 import os
-import re
+import secrets
+import string
+import time
 
 router = APIRouter()
 
+# Argon2id cost parameters. Defaults are the OWASP minimum (19 MiB, 2 passes,
+# 1 lane), sized for a fractional-vCPU Lambda; passlib's own default (64 MiB,
+# 3 passes, 4 lanes) costs ~6x more per login. Hashes embed their parameters,
+# so existing hashes keep verifying after these change
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "19456"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
 # Password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__memory_cost=ARGON2_MEMORY_KIB,
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+# Require the argon2-cffi (libargon2 C) backend; passlib would otherwise fall back
+# to the pure-Python argon2pure backend, which is orders of magnitude slower
+pwd_context.handler("argon2").set_backend("argon2_cffi")
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -31,36 +55,56 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# User lookups built once per process so SQLAlchemy reuses their compiled form
+USER_BY_USERNAME_STMT = select(User).where(User.username == bindparam("username"))
+USER_BY_EMAIL_STMT = select(User).where(User.email == bindparam("email"))
+USER_BY_GOOGLE_ID_STMT = select(User).where(User.google_id == bindparam("google_id"))
+
 def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+    return db.execute(USER_BY_USERNAME_STMT, {"username": username}).scalars().first()
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+    return db.execute(USER_BY_EMAIL_STMT, {"email": email}).scalars().first()
 
 def get_user_by_google_id(db: Session, google_id: str):
-    return db.query(User).filter(User.google_id == google_id).first()
+    return db.execute(USER_BY_GOOGLE_ID_STMT, {"google_id": google_id}).scalars().first()
+
+# Characters allowed in usernames generated from an email address
+USERNAME_CHARS = frozenset(string.ascii_lowercase + string.digits)
+
+# Numbered variants (name1..nameN) checked before falling back to a random suffix
+USERNAME_PROBE_LIMIT = 100
 
 def generate_username_from_email(email: str, db: Session) -> str:
     """Generate a unique username from email"""
-    base_username = email.split('@')[0].lower()
-    base_username = re.sub(r'[^a-z0-9]', '', base_username)  # Remove special chars
+    # Keep only a-z0-9 (removes special chars)
+    base_username = "".join(c for c in email.split('@', 1)[0].lower() if c in USERNAME_CHARS)
     if not base_username:
         base_username = "user"
     
-    username = base_username
-    counter = 1
-    while get_user(db, username):
-        username = f"{base_username}{counter}"
-        counter += 1
+    # Probe the base name and its first numbered variants in one query
+    candidates = [base_username] + [f"{base_username}{i}" for i in range(1, USERNAME_PROBE_LIMIT + 1)]
+    taken = set(db.scalars(select(User.username).where(User.username.in_(candidates))))
+    for username in candidates:
+        if username not in taken:
+            return username
     
-    return username
+    # Every probed variant is taken; a random suffix is unique in practice
+    return f"{base_username}{secrets.token_hex(3)}"
 
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    verified, new_hash = pwd_context.verify_and_update(password, user.password)
+    if not verified:
         return False
+    if new_hash:
+        # Stored hash uses older (costlier) Argon2 parameters; re-hash while we
+        # have the plaintext so later logins verify at the current cost
+        user.password = new_hash
+        db.commit()
+        logger.info(f"Re-hashed password for {username} with current Argon2 parameters")
     return user
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -73,16 +117,25 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+@lru_cache(maxsize=1024)
+def decode_access_token(token: str):
+    """Verify a JWT's signature and return its (subject, expiry), cached per token"""
+    # Invalid or already-expired tokens raise JWTError and are not cached
+    payload = jwt.decode(
+        token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]}
+    )
+    return payload["sub"], payload["exp"]
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        username, expires_at = decode_access_token(token)
+        # A cached token may have expired since it was first verified
+        if expires_at <= time.time():
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
@@ -97,9 +150,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 def signup(user: UserCreate, db: Session = Depends(get_db)):
     logger.info(f"Signup attempt for username: {user.username}")
     
+    # Check username and email in one round trip; at most one row can match each
+    existing = db.query(User.username, User.email).filter(
+        or_(User.username == user.username, User.email == user.email)
+    ).limit(2).all()
+    
     # Check if user already exists
-    db_user = get_user(db, username=user.username)
-    if db_user:
+    if any(row.username == user.username for row in existing):
         logger.warning(f"Signup failed: Username {user.username} already exists")
         raise HTTPException(
             status_code=400,
@@ -107,8 +164,7 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Check if email already exists
-    db_user_email = db.query(User).filter(User.email == user.email).first()
-    if db_user_email:
+    if existing:
         logger.warning(f"Signup failed: Email {user.email} already exists")
         raise HTTPException(
             status_code=400,
@@ -125,8 +181,16 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         bio=user.bio
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent signup took the username or email after the check above
+        db.rollback()
+        logger.warning(f"Signup failed: Username {user.username} or email {user.email} registered concurrently")
+        raise HTTPException(
+            status_code=400,
+            detail="Username or email already registered"
+        )
     
     logger.info(f"User created successfully: {user.username} (ID: {db_user.id})")
     return db_user
@@ -199,7 +263,6 @@ def google_oauth(oauth_data: GoogleOAuthRequest, db: Session = Depends(get_db)):
                     existing_user.full_name = name
                 user = existing_user
                 db.commit()
-                db.refresh(user)
                 logger.info(f"Google OAuth: Linked Google account to existing user - {user.username}")
             else:
                 # Create new user
@@ -214,7 +277,6 @@ def google_oauth(oauth_data: GoogleOAuthRequest, db: Session = Depends(get_db)):
                 )
                 db.add(user)
                 db.commit()
-                db.refresh(user)
                 logger.info(f"Google OAuth: New user created - {user.username} (ID: {user.id})")
         
         # Generate JWT token
@@ -235,7 +297,9 @@ def google_oauth(oauth_data: GoogleOAuthRequest, db: Session = Depends(get_db)):
         )
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user)):
+    # Async: the body does no blocking I/O, so it skips a threadpool hop.
+    # get_current_user (DB lookup) still runs in the threadpool
     logger.info(f"User profile accessed: {current_user.username}")
     return current_user
 
@@ -247,6 +311,19 @@ def update_user_profile(
 ):
     logger.info(f"Profile update attempt for user: {current_user.username}")
     
+    # Check the new username and email against other users in one round trip
+    conflicts = []
+    if profile_data.username is not None:
+        conflicts.append(User.username == profile_data.username)
+    if profile_data.email is not None:
+        conflicts.append(User.email == profile_data.email)
+    taken = []
+    if conflicts:
+        taken = db.query(User.username, User.email).filter(
+            or_(*conflicts),
+            User.id != current_user.id
+        ).limit(2).all()
+    
     # Update only provided fields
     if profile_data.full_name is not None:
         current_user.full_name = profile_data.full_name
@@ -254,11 +331,7 @@ def update_user_profile(
     
     if profile_data.username is not None:
         # Check if username is already taken by another user
-        existing_user = db.query(User).filter(
-            User.username == profile_data.username,
-            User.id != current_user.id
-        ).first()
-        if existing_user:
+        if any(row.username == profile_data.username for row in taken):
             logger.warning(f"Profile update failed: Username {profile_data.username} already taken")
             raise HTTPException(
                 status_code=400,
@@ -273,11 +346,7 @@ def update_user_profile(
     
     if profile_data.email is not None:
         # Check if email is already taken by another user
-        existing_user = db.query(User).filter(
-            User.email == profile_data.email,
-            User.id != current_user.id
-        ).first()
-        if existing_user:
+        if any(row.email == profile_data.email for row in taken):
             logger.warning(f"Profile update failed: Email {profile_data.email} already taken")
             raise HTTPException(
                 status_code=400,
@@ -289,8 +358,16 @@ def update_user_profile(
     # Update the updated_at timestamp
     current_user.updated_at = datetime.now()
     
-    db.commit()
-    db.refresh(current_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another user took the username or email after the check above
+        db.rollback()
+        logger.warning(f"Profile update failed: Username or email taken concurrently for {current_user.username}")
+        raise HTTPException(
+            status_code=400,
+            detail="Username or email already taken"
+        )
     
     logger.info(f"Profile updated successfully for user: {current_user.username}")
     return current_user
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy import bindparam, func, select, tuple_
 from sqlalchemy.orm import Session
 from database import get_db
 from models.user import User
@@ -6,10 +8,14 @@ from models.post import Post
 from schemas.post import PostResponse
 from routers.auth import get_current_user
 from utils.s3 import s3_handler
+from utils.counters import counter_buffer
 from logger import logger
 from pathlib import Path
-from typing import List
-from pydantic import BaseModel
+from typing import Iterable, Iterator, List, Optional
+from datetime import datetime
+import itertools
+import operator
+from pydantic import BaseModel, TypeAdapter
 
 router = APIRouter()
 
@@ -44,8 +50,79 @@ def is_allowed_file(filename: str, content_type: str) -> bool:
     has_valid_mime = content_type in ALLOWED_MIME_TYPES
     return has_valid_extension and has_valid_mime
 
+# Post columns copied into every PostResponse, read with a single C-level attrgetter call
+POST_RESPONSE_FIELDS = (
+    "id", "user_id", "image_url", "title", "caption", "tags",
+    "views", "downloads", "created_at", "updated_at",
+)
+_get_post_fields = operator.attrgetter(*POST_RESPONSE_FIELDS)
+
+def build_post_response(post: Post, username: Optional[str], user_full_name: Optional[str]) -> PostResponse:
+    """Build a PostResponse from a post row and its author's name fields"""
+    data = dict(zip(POST_RESPONSE_FIELDS, _get_post_fields(post)))
+    data["views"] = data["views"] or 0
+    data["downloads"] = data["downloads"] or 0
+    data["username"] = username
+    data["user_full_name"] = user_full_name
+    return PostResponse(**data)
+
+# Exactly the PostResponse fields, with the author joined in one round-trip.
+# Rows carry no ORM state and are validated straight into PostResponse by
+# pydantic-core (from_attributes), with no per-row dict built in Python.
+# Statements are built once per process so SQLAlchemy reuses their compiled form
+POSTS_WITH_AUTHOR_STMT = select(
+    Post.id, Post.user_id, Post.image_url, Post.title, Post.caption, Post.tags,
+    func.coalesce(Post.views, 0).label("views"),
+    func.coalesce(Post.downloads, 0).label("downloads"),
+    Post.created_at, Post.updated_at,
+    User.username, User.full_name.label("user_full_name"),
+).outerjoin(User, User.id == Post.user_id)
+
+# Feed ordered to match the idx_posts_created_at_id index for keyset pagination
+FEED_STMT = POSTS_WITH_AUTHOR_STMT.order_by(Post.created_at.desc(), Post.id.desc())
+
+# Single post lookup
+POST_BY_ID_STMT = POSTS_WITH_AUTHOR_STMT.where(Post.id == bindparam("post_id"))
+
+# Per-user listing; rows are streamed in batches of USER_POSTS_BATCH_SIZE
+USER_POSTS_STMT = FEED_STMT.where(Post.user_id == bindparam("user_id"))
+USER_POSTS_BATCH_SIZE = 200
+USER_EXISTS_STMT = select(User.id).where(User.id == bindparam("user_id"))
+
+# Post entity for write paths (delete) that need the ORM object
+POST_ENTITY_BY_ID_STMT = select(Post).where(Post.id == bindparam("post_id"))
+
+def apply_feed_cursor(stmt, cursor: Optional[datetime], cursor_id: Optional[int]):
+    """Restrict a feed-ordered statement to the posts after a (created_at, id) cursor"""
+    if cursor is None:
+        return stmt
+    if cursor_id is None:
+        # created_at alone can't page past posts sharing the boundary timestamp
+        return stmt.where(Post.created_at < cursor)
+    # Row comparison in the (created_at DESC, id DESC) index order, so posts
+    # sharing the boundary timestamp are neither skipped nor repeated
+    return stmt.where(tuple_(Post.created_at, Post.id) < tuple_(cursor, cursor_id))
+
+# Validates and encodes a whole batch of rows in one pydantic-core call
+_POST_LIST_ADAPTER = TypeAdapter(List[PostResponse])
+
+def stream_posts_json(batches: Iterable, user_id: int) -> Iterator[bytes]:
+    """Encode batches of POSTS_WITH_AUTHOR_STMT rows as one JSON array"""
+    count = 0
+    yield b"["
+    for batch in batches:
+        if count:
+            yield b","
+        # dump_json gives "[...]"; strip the brackets so batches join into one array
+        yield _POST_LIST_ADAPTER.dump_json(
+            _POST_LIST_ADAPTER.validate_python(batch, from_attributes=True)
+        )[1:-1]
+        count += len(batch)
+    yield b"]"
+    logger.info(f"Returned {count} posts for user {user_id}")
+
 @router.post("/presigned-url", response_model=PresignedUrlResponse)
-async def get_presigned_upload_url(
+def get_presigned_upload_url(
     request: PresignedUrlRequest,
     current_user: User = Depends(get_current_user)
 ):
@@ -79,7 +156,7 @@ async def get_presigned_upload_url(
         raise HTTPException(status_code=500, detail=f"Failed to generate upload URL: {str(e)}")
 
 @router.post("/confirm-upload", response_model=PostResponse)
-async def confirm_upload(
+def confirm_upload(
     request: ConfirmUploadRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -98,30 +175,17 @@ async def confirm_upload(
             image_url=request.image_url,
             title=request.title if request.title else None,
             caption=request.caption if request.caption else None,
-            tags=tags_str
+            tags=tags_str,
+            tag_list=request.tags or None
         )
         
         db.add(db_post)
         db.commit()
-        db.refresh(db_post)
         
         logger.info(f"Post created successfully: ID={db_post.id} by {current_user.username}")
         
         # Prepare response with user info
-        response = PostResponse(
-            id=db_post.id,
-            user_id=db_post.user_id,
-            image_url=db_post.image_url,
-            title=db_post.title,
-            caption=db_post.caption,
-            tags=db_post.tags,
-            views=db_post.views or 0,
-            downloads=db_post.downloads or 0,
-            created_at=db_post.created_at,
-            updated_at=db_post.updated_at,
-            username=current_user.username,
-            user_full_name=current_user.full_name
-        )
+        response = build_post_response(db_post, current_user.username, current_user.full_name)
         
         return response
         
@@ -131,7 +195,7 @@ async def confirm_upload(
         raise HTTPException(status_code=500, detail=f"Failed to create post: {str(e)}")
 
 @router.post("/upload", response_model=PostResponse)
-async def upload_post(
+def upload_post(
     file: UploadFile = File(...),
     title: str = Form(""),
     caption: str = Form(""),
@@ -186,174 +250,131 @@ async def upload_post(
         )
         db.add(db_post)
         db.commit()
-        db.refresh(db_post)
         
         logger.info(f"Post created successfully: ID {db_post.id} by {current_user.username}")
         
         # Prepare response with user info
-        response = PostResponse(
-            id=db_post.id,
-            user_id=db_post.user_id,
-            image_url=db_post.image_url,
-            title=db_post.title,
-            caption=db_post.caption,
-            tags=db_post.tags,
-            views=db_post.views or 0,
-            downloads=db_post.downloads or 0,
-            created_at=db_post.created_at,
-            updated_at=db_post.updated_at,
-            username=current_user.username,
-            user_full_name=current_user.full_name
-        )
+        response = build_post_response(db_post, current_user.username, current_user.full_name)
         
         return response
         
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        logger.error(f"Upload failed for {current_user.username}: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        # logger.exception attaches the traceback; the logging framework formats it
+        logger.exception("Upload failed for %s", current_user.username)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @router.get("", response_model=List[PostResponse])
 @router.get("/", response_model=List[PostResponse])
-async def get_all_posts(
+def get_all_posts(
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all posts (feed)"""
-    logger.info(f"Fetching posts: skip={skip}, limit={limit}")
+    """
+    Get all posts (feed)
     
-    posts = db.query(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
+    Pass the created_at and id of the last post seen as `cursor` and
+    `cursor_id` to fetch the next page via an index range scan instead of an
+    OFFSET.
+    """
+    logger.info(f"Fetching posts: skip={skip}, limit={limit}, cursor={cursor}, cursor_id={cursor_id}")
     
-    # Add user info to each post
-    response = []
-    for post in posts:
-        user = db.query(User).filter(User.id == post.user_id).first()
-        response.append(PostResponse(
-            id=post.id,
-            user_id=post.user_id,
-            image_url=post.image_url,
-            title=post.title,
-            caption=post.caption,
-            tags=post.tags,
-            views=post.views or 0,
-            downloads=post.downloads or 0,
-            created_at=post.created_at,
-            updated_at=post.updated_at,
-            username=user.username if user else None,
-            user_full_name=user.full_name if user else None
-        ))
+    stmt = apply_feed_cursor(FEED_STMT, cursor, cursor_id)
+    rows = db.execute(stmt.offset(skip).limit(limit)).all()
     
-    logger.info(f"Returned {len(response)} posts")
-    return response
+    # Author info comes from the join, no per-post user lookup; the rows are
+    # validated into PostResponse by the response_model
+    logger.info(f"Returned {len(rows)} posts")
+    return rows
 
 @router.get("/user/{user_id}", response_model=List[PostResponse])
-async def get_user_posts(
+def get_user_posts(
     user_id: int,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all posts by a specific user"""
-    logger.info(f"Fetching posts for user: {user_id}")
+    """
+    Get all posts by a specific user
     
-    posts = db.query(Post).filter(Post.user_id == user_id).order_by(Post.created_at.desc()).all()
+    Without `limit` the listing is unbounded, so rows are fetched in batches
+    and streamed to the client instead of being materialized as one list.
+    Pass `limit` (max 100) with `skip` or `cursor`/`cursor_id` to page through
+    it the same way as the feed.
+    """
+    logger.info(f"Fetching posts for user: {user_id}, skip={skip}, limit={limit}, cursor={cursor}, cursor_id={cursor_id}")
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    stmt = apply_feed_cursor(USER_POSTS_STMT, cursor, cursor_id)
+    if skip:
+        stmt = stmt.offset(skip)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = db.execute(
+        stmt.execution_options(yield_per=USER_POSTS_BATCH_SIZE),
+        {"user_id": user_id}
+    )
+    batches = result.partitions()
+    first_batch = next(batches, None)
     
-    response = []
-    for post in posts:
-        response.append(PostResponse(
-            id=post.id,
-            user_id=post.user_id,
-            image_url=post.image_url,
-            title=post.title,
-            caption=post.caption,
-            tags=post.tags,
-            views=post.views or 0,
-            downloads=post.downloads or 0,
-            created_at=post.created_at,
-            updated_at=post.updated_at,
-            username=user.username,
-            user_full_name=user.full_name
-        ))
+    # Only an empty result needs a separate check that the user exists
+    if first_batch is None and db.execute(USER_EXISTS_STMT, {"user_id": user_id}).scalar() is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    logger.info(f"Returned {len(response)} posts for user {user_id}")
-    return response
+    all_batches = itertools.chain([first_batch], batches) if first_batch is not None else ()
+    return StreamingResponse(stream_posts_json(all_batches, user_id), media_type="application/json")
 
 @router.get("/{post_id}", response_model=PostResponse)
-async def get_post_by_id(
+def get_post_by_id(
     post_id: int,
     db: Session = Depends(get_db)
 ):
     """Get a single post by ID"""
     logger.info(f"Fetching post: {post_id}")
     
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+    row = db.execute(POST_BY_ID_STMT, {"post_id": post_id}).first()
+    if not row:
         logger.warning(f"Post {post_id} not found")
         raise HTTPException(status_code=404, detail="Post not found")
     
-    user = db.query(User).filter(User.id == post.user_id).first()
-    
-    response = PostResponse(
-        id=post.id,
-        user_id=post.user_id,
-        image_url=post.image_url,
-        title=post.title,
-        caption=post.caption,
-        tags=post.tags,
-        views=post.views or 0,
-        downloads=post.downloads or 0,
-        created_at=post.created_at,
-        updated_at=post.updated_at,
-        username=user.username if user else None,
-        user_full_name=user.full_name if user else None
-    )
-    
-    return response
+    return row
 
 @router.post("/{post_id}/view")
-async def increment_view(
+def increment_view(
     post_id: int,
     db: Session = Depends(get_db)
 ):
     """Increment view count for a post"""
     logger.info(f"Incrementing view for post: {post_id}")
     
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+    # Buffered increment; written with one UPDATE ... RETURNING when flushed
+    views = counter_buffer.increment(db, "views", post_id)
+    if views is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    post.views = (post.views or 0) + 1
-    db.commit()
-    db.refresh(post)
-    
-    return {"views": post.views}
+    return {"views": views}
 
 @router.post("/{post_id}/download")
-async def increment_download(
+def increment_download(
     post_id: int,
     db: Session = Depends(get_db)
 ):
     """Increment download count for a post"""
     logger.info(f"Incrementing download for post: {post_id}")
     
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+    downloads = counter_buffer.increment(db, "downloads", post_id)
+    if downloads is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    post.downloads = (post.downloads or 0) + 1
-    db.commit()
-    db.refresh(post)
-    
-    return {"downloads": post.downloads}
+    return {"downloads": downloads}
 
 @router.delete("/{post_id}")
-async def delete_post(
+def delete_post(
     post_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -361,7 +382,7 @@ async def delete_post(
     """Delete a post (only by owner)"""
     logger.info(f"Delete request for post {post_id} by {current_user.username}")
     
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = db.execute(POST_ENTITY_BY_ID_STMT, {"post_id": post_id}).scalars().first()
     if not post:
         logger.warning(f"Post {post_id} not found")
         raise HTTPException(status_code=404, detail="Post not found")
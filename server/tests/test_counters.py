@@ -0,0 +1,85 @@
+"""
+CounterBuffer behaviour under concurrent increments
+"""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# Importing utils builds the engine and S3 client; neither connects in these tests
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/test")
+os.environ.setdefault("S3_BUCKET_NAME", "test")
+
+from utils.counters import CounterBuffer
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+    
+    def all(self):
+        return self.rows
+    
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+class FakeSession:
+    """Stands in for the posts table; execute() is slow so calls overlap"""
+    
+    def __init__(self, posts: dict[int, dict[str, int]]):
+        self.posts = posts
+    
+    def execute(self, statement, params):
+        time.sleep(0.05)
+        if "post_id" in params:
+            post = self.posts.get(params["post_id"])
+            if post is None:
+                return FakeResult([])
+            kind = "views" if "views" in str(statement) else "downloads"
+            post[kind] += 1
+            return FakeResult([(post[kind],)])
+        
+        rows = []
+        for i in range(len(params) // 3):
+            post = self.posts.get(params[f"id{i}"])
+            if post is not None:
+                post["views"] += params[f"views{i}"]
+                post["downloads"] += params[f"downloads{i}"]
+                rows.append((params[f"id{i}"], post["views"], post["downloads"]))
+        return FakeResult(rows)
+    
+    def commit(self):
+        pass
+    
+    def rollback(self):
+        pass
+
+def increment_concurrently(buffer: CounterBuffer, db: FakeSession, post_id: int, threads: int = 8):
+    results = [0] * threads
+    
+    def run(i):
+        results[i] = buffer.increment(db, "views", post_id)
+    
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+def test_write_through_missing_post_returns_none():
+    db = FakeSession({1: {"views": 0, "downloads": 0}})
+    buffer = CounterBuffer(flush_size=1)
+    
+    assert increment_concurrently(buffer, db, 999) == [None] * 8
+    assert sorted(increment_concurrently(buffer, db, 1)) == list(range(1, 9))
+
+def test_buffered_missing_post_returns_none():
+    db = FakeSession({1: {"views": 0, "downloads": 0}})
+    # flush_interval=0 makes every increment due, so flushes race each other
+    buffer = CounterBuffer(flush_size=2, flush_interval=0)
+    
+    assert increment_concurrently(buffer, db, 999) == [None] * 8
+    assert None not in increment_concurrently(buffer, db, 1)
+    assert db.posts[1]["views"] == 8
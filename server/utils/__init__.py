@@ -2,6 +2,7 @@
 Utilities package
 """
 from .s3 import s3_handler, S3Handler
+from .counters import counter_buffer, CounterBuffer
 
-__all__ = ["s3_handler", "S3Handler"]
+__all__ = ["s3_handler", "S3Handler", "counter_buffer", "CounterBuffer"]
 
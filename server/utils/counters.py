@@ -0,0 +1,202 @@
+"""
+Write-behind buffer for post view/download counters
+"""
+from collections import defaultdict
+from functools import lru_cache
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from logger import logger
+from typing import Optional
+import atexit
+import os
+import threading
+import time
+
+@lru_cache(maxsize=64)
+def flush_statement(rows: int):
+    """Build (once per batch size) the UPDATE that applies `rows` VALUES rows of deltas"""
+    values = ", ".join(f"(:id{i}, :views{i}, :downloads{i})" for i in range(rows))
+    return text(
+        "UPDATE posts SET "
+        "views = COALESCE(posts.views, 0) + v.views, "
+        "downloads = COALESCE(posts.downloads, 0) + v.downloads "
+        f"FROM (VALUES {values}) AS v(id, views, downloads) "
+        "WHERE posts.id = v.id "
+        "RETURNING posts.id, posts.views, posts.downloads"
+    )
+
+# Write-through increments: the row lock on the post is the only serialization
+INCREMENT_STATEMENTS = {
+    kind: text(
+        f"UPDATE posts SET {kind} = COALESCE({kind}, 0) + 1 "
+        f"WHERE id = :post_id RETURNING {kind}"
+    )
+    for kind in ("views", "downloads")
+}
+
+class CounterBuffer:
+    """
+    Coalesce view/download increments in memory and apply them to the
+    posts table with a single UPDATE ... FROM (VALUES ...) statement.
+    
+    A flush happens once `flush_size` distinct (kind, post_id) keys are
+    pending or `flush_interval` seconds have passed since the last flush.
+    With flush_size=1 (the default) the buffer is bypassed and every
+    increment is a single-row UPDATE ... RETURNING.
+    """
+    
+    KINDS = ("views", "downloads")
+    # Upper bound on remembered totals and missing ids; the oldest are
+    # evicted when exceeded
+    MAX_TOTALS = 10_000
+    
+    def __init__(self, flush_size: int = 1, flush_interval: float = 2.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending: defaultdict[tuple[str, int], int] = defaultdict(int)
+        # Last totals read back from the database, keyed like _pending
+        self._totals: dict[tuple[str, int], int] = {}
+        # Post IDs a flush found missing (a dict used as an ordered set)
+        self._missing: dict[int, None] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # Serializes flushes (buffered mode only), so once a flush holds it
+        # every increment taken by an earlier flush has been applied and its
+        # total or absence recorded
+        self._flush_lock = threading.Lock()
+    
+    def increment(self, db: Session, kind: str, post_id: int) -> Optional[int]:
+        """
+        Record one increment and flush if the buffer is due
+        
+        Args:
+            db: Session used if this call triggers a flush
+            kind: "views" or "downloads"
+            post_id: ID of the post
+            
+        Returns:
+            Best-known total for the counter (exact when written through or
+            right after a flush), or None if the post does not exist
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown counter: {kind}")
+        
+        if self.flush_size <= 1:
+            return self._write_through(db, kind, post_id)
+        
+        key = (kind, post_id)
+        with self._lock:
+            self._pending[key] += 1
+            due = (
+                len(self._pending) >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        
+        if due:
+            # Whichever flush took this increment has finished (and recorded
+            # the post as missing if it was) once this returns
+            self.flush(db)
+        
+        with self._lock:
+            if post_id in self._missing:
+                return None
+            return self._totals.get(key, 0) + self._pending.get(key, 0)
+    
+    def _write_through(self, db: Session, kind: str, post_id: int) -> Optional[int]:
+        """Apply one increment directly; None if the post does not exist"""
+        try:
+            total = db.execute(INCREMENT_STATEMENTS[kind], {"post_id": post_id}).scalar()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to update post counter: {str(e)}")
+            raise
+        return total
+    
+    def flush(self, db: Optional[Session] = None) -> tuple[set[int], set[int]]:
+        """
+        Apply all pending increments in one statement
+        
+        Returns:
+            IDs of the posts in the flushed batch, and the subset that exist
+            (were updated)
+        """
+        with self._flush_lock:
+            return self._flush(db)
+    
+    def _flush(self, db: Optional[Session]) -> tuple[set[int], set[int]]:
+        """Flush with _flush_lock held"""
+        with self._lock:
+            batch = self._pending
+            self._pending = defaultdict(int)
+            self._last_flush = time.monotonic()
+        
+        if not batch:
+            return set(), set()
+        
+        # One VALUES row per post carrying both deltas
+        deltas: dict[int, list[int]] = defaultdict(lambda: [0, 0])
+        for (kind, post_id), delta in batch.items():
+            deltas[post_id][self.KINDS.index(kind)] += delta
+        
+        params = {}
+        for i, (post_id, (views, downloads)) in enumerate(deltas.items()):
+            params[f"id{i}"] = post_id
+            params[f"views{i}"] = views
+            params[f"downloads{i}"] = downloads
+        # The SQL only depends on the row count, so the TextClause is reused
+        statement = flush_statement(len(deltas))
+        
+        owns_session = db is None
+        if owns_session:
+            db = SessionLocal()
+        try:
+            rows = db.execute(statement, params).all()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush post counters: {str(e)}")
+            # Put the increments back so they are retried on the next flush
+            with self._lock:
+                for key, delta in batch.items():
+                    self._pending[key] += delta
+            raise
+        finally:
+            if owns_session:
+                db.close()
+        
+        updated = {row[0] for row in rows}
+        with self._lock:
+            for post_id, views, downloads in rows:
+                # Re-insert so the dict stays ordered oldest-first for eviction
+                for key, total in ((("views", post_id), views), (("downloads", post_id), downloads)):
+                    self._totals.pop(key, None)
+                    self._totals[key] = total
+            for post_id in deltas:
+                if post_id in updated:
+                    self._missing.pop(post_id, None)
+                else:
+                    # Forget totals of posts that no longer exist
+                    self._totals.pop(("views", post_id), None)
+                    self._totals.pop(("downloads", post_id), None)
+                    self._missing[post_id] = None
+            while len(self._totals) > self.MAX_TOTALS:
+                del self._totals[next(iter(self._totals))]
+            while len(self._missing) > self.MAX_TOTALS:
+                del self._missing[next(iter(self._missing))]
+        
+        return set(deltas), updated
+
+def _flush_at_exit():
+    try:
+        counter_buffer.flush()
+    except Exception:
+        pass
+
+# Create a singleton instance
+counter_buffer = CounterBuffer(
+    flush_size=int(os.getenv("COUNTER_FLUSH_SIZE", "1")),
+    flush_interval=float(os.getenv("COUNTER_FLUSH_INTERVAL", "2.0")),
+)
+atexit.register(_flush_at_exit)